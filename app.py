@@ -5,43 +5,65 @@ Web-based Risk Calculator using Flask
 Supports both All-cause and Cardiovascular Mortality Prediction
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request
 import joblib
 import numpy as np
+import orjson
 import pandas as pd
 import os
 import shap
 import base64
+import gzip
+import threading
+from functools import lru_cache
 from io import BytesIO
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 
-# Set font to Times New Roman globally for matplotlib
-plt.rcParams['font.family'] = 'Times New Roman'
-plt.rcParams['font.sans-serif'] = ['Times New Roman']
-plt.rcParams['mathtext.fontset'] = 'stix'  # Use STIX font for math text which is similar to Times New Roman
-plt.rcParams['mathtext.rm'] = 'Times New Roman'
-plt.rcParams['mathtext.it'] = 'Times New Roman:italic'
-plt.rcParams['mathtext.bf'] = 'Times New Roman:bold'
+# Use the generic serif family for matplotlib: Times New Roman is picked up where installed
+# and other hosts fall back to the bundled DejaVu Serif without a failing font lookup per label
+plt.rcParams['font.family'] = 'serif'
+plt.rcParams['font.serif'] = ['Times New Roman', 'DejaVu Serif']
+plt.rcParams['mathtext.fontset'] = 'stix'  # Bundled STIX font for math text which is similar to Times New Roman
+
+# One figure is reused for every SHAP plot instead of allocating a new one per request.
+# pyplot keeps global "current figure" state, so drawing is serialized with a lock.
+shap_figure = plt.figure()
+shap_plot_lock = threading.Lock()
 
 app = Flask(__name__)
 
+def ojsonify(obj):
+    """JSON response serialized with orjson (fast for the large base64 plot string)"""
+    return app.response_class(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY), mimetype='application/json')
+
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_DIR = os.path.join(BASE_DIR, "models")
 SCALER_PATH = os.path.join(BASE_DIR, "scaler.pkl")
 DATA_PATH = os.path.join(BASE_DIR, "训练集_标准化后.csv")
 
+def load_model(path):
+    """Load a joblib pickle, streaming from a .gz copy if only the compressed file is deployed"""
+    if not os.path.exists(path) and os.path.exists(path + '.gz'):
+        # Unpickle straight from the gzip stream instead of writing a decompressed copy to disk
+        with gzip.open(path + '.gz', 'rb') as f:
+            return joblib.load(f)
+    return joblib.load(path)
+
 # Load models and scaler
 print("Loading models and scaler...")
 try:
-    scaler = joblib.load(SCALER_PATH)
+    scaler = load_model(SCALER_PATH)
     print(f"✓ Scaler loaded successfully")
-    model_all_cause = joblib.load(os.path.join(MODEL_DIR, "CI_all_cause_death_GradientBoostingSurvival.pkl"))
+    model_all_cause = load_model(os.path.join(MODEL_DIR, "CI_all_cause_death_GradientBoostingSurvival.pkl"))
     print(f"✓ All-cause model loaded successfully")
-    model_cardiovascular = joblib.load(os.path.join(MODEL_DIR, "CI_cardiovascular_death_RandomSurvivalForest.pkl"))
+    model_cardiovascular = load_model(os.path.join(MODEL_DIR, "CI_cardiovascular_death_RandomSurvivalForest.pkl"))
     print(f"✓ Cardiovascular model loaded successfully")
+    # Spread RSF tree traversal across threads (trees release the GIL); gunicorn_config.py
+    # lowers this per worker so workers x threads does not oversubscribe the CPU
+    model_cardiovascular.n_jobs = int(os.environ.get('MODEL_N_JOBS', os.cpu_count() or 1))
 except Exception as e:
     print(f"✗ ERROR loading models: {e}")
     print(f"  Python version: {os.sys.version}")
@@ -137,25 +159,22 @@ feature_info = {
     'BUN': {'min': 1.0, 'max': 150, 'step': 0.1, 'unit': 'mg/dL', 'type': 'number'}
 }
 
-# Initialize SHAP explainers
-print("Initializing SHAP explainers (this may take a moment)...")
-# Use ALL training data (approximately 7000 samples) for SHAP background
-X_all_cause = df_train[all_cause_features]
-X_cardio = df_train[cardiovascular_features]
+def get_horizon_index(model):
+    """Position of TIME_HORIZON on the model's survival time grid (step function: last time <= horizon)"""
+    return int(np.searchsorted(model.unique_times_, TIME_HORIZON, side='right')) - 1
 
-print(f"Using {len(X_all_cause)} training samples for SHAP background data...")
+# Survival models evaluate on a fixed time grid, so the horizon position is cached once
+horizon_idx = {
+    'all_cause': get_horizon_index(model_all_cause) if hasattr(model_all_cause, 'unique_times_') else None,
+    'cardio': get_horizon_index(model_cardiovascular) if hasattr(model_cardiovascular, 'unique_times_') else None
+}
 
 def predict_all_cause(data):
     """Predict all-cause mortality probability at 20 years"""
     if hasattr(model_all_cause, "predict_survival_function"):
-        surv_funcs = model_all_cause.predict_survival_function(data)
-        death_probs = []
-        for surv_func in surv_funcs:
-            # Get survival probability at TIME_HORIZON
-            surv_prob = surv_func(TIME_HORIZON)
-            death_prob = 1.0 - surv_prob
-            death_probs.append(death_prob)
-        return np.array(death_probs)
+        # Read survival probability at TIME_HORIZON straight from the time grid
+        surv_probs = model_all_cause.predict_survival_function(data, return_array=True)
+        return 1.0 - surv_probs[:, horizon_idx['all_cause']]
     else:
         # Fallback for models without survival function (e.g. classifiers)
         risk_scores = model_all_cause.predict(data)
@@ -164,14 +183,9 @@ def predict_all_cause(data):
 def predict_cardio(data):
     """Predict cardiovascular mortality probability at 20 years"""
     if hasattr(model_cardiovascular, "predict_survival_function"):
-        surv_funcs = model_cardiovascular.predict_survival_function(data)
-        death_probs = []
-        for surv_func in surv_funcs:
-            # Get survival probability at TIME_HORIZON
-            surv_prob = surv_func(TIME_HORIZON)
-            death_prob = 1.0 - surv_prob
-            death_probs.append(death_prob)
-        return np.array(death_probs)
+        # Read survival probability at TIME_HORIZON straight from the time grid
+        surv_probs = model_cardiovascular.predict_survival_function(data, return_array=True)
+        return 1.0 - surv_probs[:, horizon_idx['cardio']]
     elif hasattr(model_cardiovascular, "predict_proba"):
         probs = model_cardiovascular.predict_proba(data)
         return probs[:, 1] if probs.shape[1] == 2 else probs
@@ -194,13 +208,106 @@ print(f"Risk Thresholds (20-Year):")
 print(f"  All-cause: Low < {thresholds['all_cause']['low']:.1%} | Medium | High > {thresholds['all_cause']['high']:.1%}")
 print(f"  Cardio:    Low < {thresholds['cardio']['low']:.1%} | Medium | High > {thresholds['cardio']['high']:.1%}")
 
+# Precompute per-model column positions and clipping bounds so requests avoid pandas work
+def build_input_layout(features):
+    """Column positions and training-range bounds for building a model input row"""
+    # Map Dyslipidemia back to HighCholesterol for scaler compatibility
+    model_features = ['HighCholesterol' if f == 'Dyslipidemia' else f for f in features]
+    continuous_idx = [i for i, f in enumerate(model_features) if f not in categorical_features]
+
+    # Clip inputs to training data range to avoid extrapolation (0.5th-99.5th percentiles)
+    # Note: df_train has standardized values for continuous features and raw for categorical
+    train_subset = df_train[features]
+    scaler_idx = np.array([scaler_features.index(model_features[i]) for i in continuous_idx])
+
+    # StandardScaler parameters applied inline instead of scaler.transform.
+    # Categorical columns get mean 0 / scale 1 so the whole row standardizes in one expression.
+    mean = np.zeros(len(features))
+    scale = np.ones(len(features))
+    mean[continuous_idx] = scaler.mean_[scaler_idx]
+    scale[continuous_idx] = scaler.scale_[scaler_idx]
+    return {
+        'continuous_idx': np.array(continuous_idx),
+        'scaler_idx': scaler_idx,
+        'mean': mean,
+        'scale': scale,
+        'clip_min': train_subset.quantile(0.005).values,
+        'clip_max': train_subset.quantile(0.995).values,
+    }
+
+def check_inline_scaling(layout):
+    """Verify inline standardization matches scaler.transform"""
+    sample = scaler.mean_ + scaler.scale_ * np.random.default_rng(0).normal(size=(5, len(scaler_features)))
+    expected = scaler.transform(pd.DataFrame(sample, columns=scaler_features))[:, layout['scaler_idx']]
+    continuous_idx = layout['continuous_idx']
+    inline = (sample[:, layout['scaler_idx']] - layout['mean'][continuous_idx]) / layout['scale'][continuous_idx]
+    if not np.allclose(inline, expected):
+        raise ValueError("Inline standardization does not match scaler.transform")
+
+input_layouts = {
+    'all_cause': build_input_layout(all_cause_features),
+    'cardio': build_input_layout(cardiovascular_features)
+}
+for layout in input_layouts.values():
+    check_inline_scaling(layout)
+
 # Create SHAP explainers
-# Cluster all training data into representative points for computational efficiency
-# Using 100 cluster centers to balance accuracy and computation time (consistent with paper methodology)
-print("Clustering training data for SHAP (this may take 1-2 minutes)...")
-explainer_all_cause = shap.KernelExplainer(predict_all_cause, shap.kmeans(X_all_cause, 100))
-explainer_cardio = shap.KernelExplainer(predict_cardio, shap.kmeans(X_cardio, 100))
-print(f"SHAP explainers initialized: {len(X_all_cause)} training samples -> 100 cluster centers")
+# shap.TreeExplainer does not recognise scikit-survival models, so the fitted trees are
+# handed over in shap's generic dict format. Path-dependent TreeSHAP needs no background data.
+# FastTreeSHAP (algorithm="v2") is not used: its last release is incompatible with NumPy 2,
+# and plain TreeSHAP already takes only a few milliseconds per patient on these models.
+print("Initializing SHAP explainers...")
+
+def tree_to_dict(tree, values):
+    """Convert a fitted sklearn tree structure to shap's dict tree format"""
+    return {
+        'children_left': tree.children_left,
+        'children_right': tree.children_right,
+        'children_default': tree.children_left,
+        'features': tree.feature,
+        'thresholds': tree.threshold.astype(np.float64),
+        'values': np.asarray(values, dtype=np.float64).reshape(-1, 1),
+        'node_sample_weight': tree.weighted_n_node_samples.astype(np.float64),
+    }
+
+def build_all_cause_trees():
+    """Gradient boosting trees; leaf values sum to the log hazard ratio"""
+    learning_rate = model_all_cause.learning_rate
+    return {
+        'trees': [tree_to_dict(est.tree_, est.tree_.value[:, 0, 0] * learning_rate)
+                  for est in model_all_cause.estimators_[:, 0]],
+        'base_offset': 0.0,
+        'input_dtype': np.float32,  # sklearn trees split on float32 inputs
+    }
+
+def build_cardio_trees():
+    """Random survival forest trees; leaf values average to the 20-year death probability"""
+    time_idx = horizon_idx['cardio']
+    n_trees = len(model_cardiovascular.estimators_)
+    return {
+        'trees': [tree_to_dict(est.tree_, (1.0 - est.tree_.value[:, time_idx, 1]) / n_trees)
+                  for est in model_cardiovascular.estimators_],
+        'base_offset': 0.0,
+        'input_dtype': np.float32,  # sklearn trees split on float32 inputs
+    }
+
+explainer_all_cause = shap.TreeExplainer(build_all_cause_trees(), feature_perturbation="tree_path_dependent")
+explainer_cardio = shap.TreeExplainer(build_cardio_trees(), feature_perturbation="tree_path_dependent")
+print("SHAP explainers initialized (TreeSHAP, tree_path_dependent)")
+
+def get_base_value(explainer):
+    """Reduce an explainer's expected value to a single float"""
+    base_value = explainer.expected_value
+    if isinstance(base_value, (list, np.ndarray)):
+        if len(base_value) > 1:
+            base_value = base_value[1] if len(base_value) == 2 else base_value[0]
+        else:
+            base_value = base_value[0]
+    return float(base_value)
+
+# Expected values are fixed once the explainers are built, so cache them here
+base_value_all_cause = get_base_value(explainer_all_cause)
+base_value_cardio = get_base_value(explainer_cardio)
 
 @app.route('/')
 def index():
@@ -211,194 +318,169 @@ def index():
                          feature_mapping=feature_mapping,
                          feature_info=feature_info)
 
+def get_model_config(model_key):
+    """Features, explainer, base value, predict function and input layout for a model"""
+    if model_key == 'all_cause':
+        return all_cause_features, explainer_all_cause, base_value_all_cause, predict_all_cause, input_layouts['all_cause']
+    return cardiovascular_features, explainer_cardio, base_value_cardio, predict_cardio, input_layouts['cardio']
+
+def standardize_inputs(layout, input_values):
+    """Standardize and clip raw inputs of shape (n_patients, n_features)"""
+    # Standardize continuous features (categorical features pass through unchanged), then
+    # clip inputs to training data range to avoid extrapolation
+    # This prevents the model from behaving unpredictably for out-of-distribution values
+    input_standardized = (input_values - layout['mean']) / layout['scale']
+    return np.clip(input_standardized, layout['clip_min'], layout['clip_max'])
+
+def describe_risk(model_key, prediction):
+    """Prediction label and risk-level note for a 20-year mortality probability"""
+    # Determine Risk Level
+    low_thresh = thresholds[model_key]['low']
+    high_thresh = thresholds[model_key]['high']
+    
+    if prediction < low_thresh:
+        risk_level = "Low Risk"
+    elif prediction < high_thresh:
+        risk_level = "Medium Risk"
+    else:
+        risk_level = "High Risk"
+
+    # Generate prediction label
+    if model_key == 'all_cause':
+        prediction_label = f"20-Year All-Cause Mortality Risk: {prediction:.2%}"
+        prediction_note = (f"Risk Level: {risk_level}. "
+                           "Note: 'High Risk' is defined by the optimal statistical threshold (Youden Index) "
+                           "for 20-year mortality.")
+    else:
+        prediction_label = f"20-Year Cardiovascular Mortality Risk: {prediction:.2%}"
+        prediction_note = (f"Risk Level: {risk_level}. "
+                           "Note: This estimates the probability of cardiovascular death within 20 years. "
+                           "'High Risk' warrants closer cardiovascular surveillance.")
+    return prediction_label, prediction_note
+
+def get_shap_values(explainer, input_standardized):
+    """SHAP values of shape (n_patients, n_features) (exact TreeSHAP, no sampling)"""
+    shap_values = explainer.shap_values(input_standardized)
+    
+    # Handle list output from explainer
+    if isinstance(shap_values, list):
+        shap_values = shap_values[1] if len(shap_values) == 2 else shap_values[0]
+    return np.asarray(shap_values)
+
+def build_shap_contributions(display_names, input_row, shap_row):
+    """SHAP contributions for display, sorted by absolute SHAP value"""
+    order = np.argsort(-np.abs(shap_row), kind='stable')
+    return [{
+        'feature': display_names[i],
+        'value': float(input_row[i]),
+        'shap_value': float(shap_row[i])
+    } for i in order]
+
+# Each cached result carries a ~100-140 KB base64 SVG, so 256 entries is ~35 MB per worker
+@lru_cache(maxsize=256)
+def compute_prediction(model_key, input_values, explain=True):
+    """Run prediction and (optionally) SHAP explanation for one patient (memoized on exact inputs)"""
+    features, explainer, base_value, predict_fn, layout = get_model_config(model_key)
+    input_values = np.array(input_values)
+    input_standardized = standardize_inputs(layout, input_values.reshape(1, -1))
+
+    # Make prediction
+    prediction = float(predict_fn(input_standardized)[0])
+    prediction_label, prediction_note = describe_risk(model_key, prediction)
+    
+    result = {
+        'success': True,
+        'prediction': prediction,
+        'prediction_label': prediction_label,
+        'prediction_note': prediction_note,
+        'base_value': base_value,
+        'shap_plot': None,
+        'shap_contributions': None
+    }
+    
+    # SHAP and the plot dominate the cost; skip them when the caller does not need them
+    if not explain:
+        return result
+    
+    shap_values = get_shap_values(explainer, input_standardized)
+    
+    # Create display names
+    display_names = [feature_mapping.get(f, f) for f in features]
+    
+    # Create SHAP explanation object
+    shap_explanation = shap.Explanation(
+        values=shap_values[0],
+        base_values=base_value,
+        data=input_values,
+        feature_names=display_names
+    )
+    
+    # Generate waterfall plot on the shared figure and convert to base64 SVG
+    # (vector output stays sharp at any zoom without a huge raster)
+    buffer = BytesIO()
+    with shap_plot_lock:
+        shap_figure.clear()
+        plt.figure(shap_figure.number)
+        shap.plots.waterfall(shap_explanation, show=False, max_display=15)
+        shap_figure.savefig(buffer, format='svg', bbox_inches='tight')
+    
+    result['shap_plot'] = base64.b64encode(buffer.getvalue()).decode()
+    result['shap_contributions'] = build_shap_contributions(display_names, input_values, shap_values[0])
+    return result
+
+def compute_batch(model_key, input_rows, explain=True):
+    """Score several patients with one model and one SHAP call (no plots in batch mode)"""
+    features, explainer, base_value, predict_fn, layout = get_model_config(model_key)
+    input_values = np.array(input_rows, dtype=np.float64).reshape(-1, len(features))
+    input_standardized = standardize_inputs(layout, input_values)
+    
+    predictions = predict_fn(input_standardized)
+    shap_values = get_shap_values(explainer, input_standardized) if explain else None
+    display_names = [feature_mapping.get(f, f) for f in features]
+    
+    results = []
+    for i, prediction in enumerate(predictions):
+        prediction = float(prediction)
+        prediction_label, prediction_note = describe_risk(model_key, prediction)
+        results.append({
+            'prediction': prediction,
+            'prediction_label': prediction_label,
+            'prediction_note': prediction_note,
+            'shap_contributions': (build_shap_contributions(display_names, input_values[i], shap_values[i])
+                                   if explain else None)
+        })
+    
+    return {
+        'success': True,
+        'base_value': base_value,
+        'results': results
+    }
+
 @app.route('/predict', methods=['POST'])
 def predict():
     """Handle prediction request"""
     try:
-        data = request.json
+        data = orjson.loads(request.get_data())
         model_type = data.get('model_type', 'all_cause')
-        
-        # Select model and features
-        if model_type == 'all_cause':
-            features = all_cause_features
-            explainer = explainer_all_cause
-            predict_fn = predict_all_cause
-        else:
-            features = cardiovascular_features
-            explainer = explainer_cardio
-            predict_fn = predict_cardio
-        
-        # Extract input values
-        input_values = []
-        for feat in features:
-            value = float(data.get(feat, 0))
-            input_values.append(value)
-        
-        # Create DataFrame with original values
-        input_df_original = pd.DataFrame([input_values], columns=features)
-        
-        # Map Dyslipidemia back to HighCholesterol for model compatibility
-        input_df_for_model = input_df_original.copy()
-        if 'Dyslipidemia' in input_df_for_model.columns:
-            input_df_for_model = input_df_for_model.rename(columns={'Dyslipidemia': 'HighCholesterol'})
-        
-        # Separate categorical and continuous features
-        model_features = list(input_df_for_model.columns)
-        continuous_features_in_model = [f for f in model_features if f not in categorical_features]
-        
-        # Create full feature DataFrame for scaler
-        input_full = pd.DataFrame(0.0, index=[0], columns=scaler_features)
-        
-        # Fill in continuous features
-        for col in continuous_features_in_model:
-            if col in scaler_features:
-                input_full[col] = input_df_for_model[col].values[0]
-        
-        # Standardize continuous features
-        continuous_standardized = scaler.transform(input_full)
-        
-        # Get standardized values
-        continuous_standardized_dict = {}
-        for col in continuous_features_in_model:
-            if col in scaler_features:
-                idx = scaler_features.index(col)
-                continuous_standardized_dict[col] = continuous_standardized[0, idx]
-        
-        # Combine standardized continuous features with categorical features
-        final_input = []
-        for col in model_features:
-            if col in categorical_features:
-                final_input.append(input_df_for_model[col].values[0])
-            else:
-                final_input.append(continuous_standardized_dict[col])
-        
-        input_standardized = np.array([final_input])
-        
-        # Clip inputs to training data range to avoid extrapolation
-        # This prevents the model from behaving unpredictably for out-of-distribution values
-        try:
-            # Map model features to training data features (handle Dyslipidemia/HighCholesterol mismatch)
-            train_features = []
-            for feat in model_features:
-                if feat == 'HighCholesterol' and 'Dyslipidemia' in df_train.columns:
-                    train_features.append('Dyslipidemia')
-                elif feat == 'Dyslipidemia' and 'HighCholesterol' in df_train.columns:
-                    train_features.append('HighCholesterol')
-                else:
-                    train_features.append(feat)
-
-            # Get training data for the specific model features
-            # Note: df_train has standardized values for continuous features and raw for categorical
-            train_subset = df_train[train_features]
-            
-            # Calculate min and max from training data (using percentiles to avoid outliers)
-            # Using 0.5th and 99.5th percentiles to be robust against outliers
-            train_min = train_subset.quantile(0.005).values
-            train_max = train_subset.quantile(0.995).values
-            
-            # Clip the input
-            input_standardized = np.clip(input_standardized, train_min, train_max)
-            print(f"Input clipped to training range (0.5-99.5 percentile) for stability.")
-        except Exception as e:
-            print(f"Warning: Could not clip input to training range: {e}")
-
-        # Make prediction
-        prediction = float(predict_fn(input_standardized)[0])
-        
-        # Determine Risk Level
         model_key = 'all_cause' if model_type == 'all_cause' else 'cardio'
-        low_thresh = thresholds[model_key]['low']
-        high_thresh = thresholds[model_key]['high']
-        
-        if prediction < low_thresh:
-            risk_level = "Low Risk"
-            risk_color = "green"
-            risk_desc = "Below half of optimal cutoff"
-        elif prediction < high_thresh:
-            risk_level = "Medium Risk"
-            risk_color = "orange"
-            risk_desc = "Intermediate risk zone"
-        else:
-            risk_level = "High Risk"
-            risk_color = "red"
-            risk_desc = "Above optimal Youden cutoff"
-
-        # Generate prediction label
-        if model_type == 'all_cause':
-            prediction_label = f"20-Year All-Cause Mortality Risk: {prediction:.2%}"
-            prediction_note = (f"Risk Level: {risk_level}. "
-                               "Note: 'High Risk' is defined by the optimal statistical threshold (Youden Index) "
-                               "for 20-year mortality.")
-        else:
-            prediction_label = f"20-Year Cardiovascular Mortality Risk: {prediction:.2%}"
-            prediction_note = (f"Risk Level: {risk_level}. "
-                               "Note: This estimates the probability of cardiovascular death within 20 years. "
-                               "'High Risk' warrants closer cardiovascular surveillance.")
+        features = all_cause_features if model_key == 'all_cause' else cardiovascular_features
         
-        # Calculate SHAP values with higher accuracy
-        # nsamples=1000 ensures precision as per methodology
-        shap_values = explainer.shap_values(input_standardized, nsamples=1000)
+        # 'explain': false returns only the risk, without SHAP values or plot
+        explain = bool(data.get('explain', True))
         
-        # Handle list output from explainer
-        if isinstance(shap_values, list):
-            shap_values = shap_values[1] if len(shap_values) == 2 else shap_values[0]
+        # A list of patients is scored as one vectorized batch
+        if 'patients' in data:
+            input_rows = [[float(patient.get(feat, 0)) for feat in features] for patient in data['patients']]
+            return ojsonify(compute_batch(model_key, input_rows, explain))
         
-        # Get base value
-        base_value = explainer.expected_value
-        if isinstance(base_value, (list, np.ndarray)):
-            if len(base_value) > 1:
-                base_value = base_value[1] if len(base_value) == 2 else base_value[0]
-            else:
-                base_value = base_value[0]
-        base_value = float(base_value)
-        
-        # Create display names
-        display_names = [feature_mapping.get(f, f) for f in features]
-        
-        # Create SHAP explanation object
-        shap_explanation = shap.Explanation(
-            values=shap_values[0],
-            base_values=base_value,
-            data=input_df_original.values[0],
-            feature_names=display_names
-        )
-        
-        # Generate waterfall plot
-        shap.plots.waterfall(shap_explanation, show=False, max_display=15)
-        
-        # Convert to base64 image
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=1200, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode()
-        plt.close()
-        
-        # Prepare SHAP contributions for display
-        shap_contributions = []
-        for i, feat in enumerate(features):
-            shap_contributions.append({
-                'feature': feature_mapping.get(feat, feat),
-                'value': float(input_df_original.iloc[0, i]),
-                'shap_value': float(shap_values[0][i])
-            })
-        
-        # Sort by absolute SHAP value
-        shap_contributions.sort(key=lambda x: abs(x['shap_value']), reverse=True)
-        
-        return jsonify({
-            'success': True,
-            'prediction': prediction,
-            'prediction_label': prediction_label,
-            'prediction_note': prediction_note,
-            'base_value': base_value,
-            'shap_plot': image_base64,
-            'shap_contributions': shap_contributions
-        })
+        # Extract input values; repeat submissions are served from the cache
+        input_values = tuple(float(data.get(feat, 0)) for feat in features)
+        return ojsonify(compute_prediction(model_key, input_values, explain))
         
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': str(e)
         })
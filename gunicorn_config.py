@@ -1,5 +1,18 @@
 import os
 
-workers = 4
+workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "gthread"
+threads = 4
 bind = "0.0.0.0:{}".format(os.environ.get("PORT", "5001"))
 timeout = 120
+
+# Load models and build SHAP explainers once in the master process; forked workers share
+# the loaded arrays copy-on-write instead of each importing the app separately
+preload_app = True
+
+# Share the CPU between workers: each worker's RandomSurvivalForest gets an equal slice of
+# cores, and numpy/BLAS stay single-threaded so workers x threads does not oversubscribe.
+# These are read when the app is imported, so they must be set before that happens.
+os.environ.setdefault("MODEL_N_JOBS", str(max(1, (os.cpu_count() or 1) // workers)))
+for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(var, "1")